@@ -1,16 +1,32 @@
+import os
+
+# Threads per worker for numpy/faiss/onnxruntime; set before those libraries start their
+# thread pools. Recommended value: physical cores / gunicorn workers.
+os.environ.setdefault('OMP_NUM_THREADS', '4')
+NUM_THREADS = int(os.environ['OMP_NUM_THREADS'])
+
 import json
+import orjson
+import hashlib
+import math
+from functools import lru_cache
+from operator import itemgetter
+from string import Template
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import onnxruntime as ort
+from tokenizers import Tokenizer
 import faiss
-from typing import List, Dict
-from flask import Flask, request, jsonify, render_template
+from typing import Callable, List, Dict, Optional
+from flask import Flask, Response, request, render_template
 import webbrowser
-import os
 import logging
 import re
+import shutil
+import threading
+import uuid
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__, template_folder='templates')
@@ -21,25 +37,43 @@ FORBIDDEN_KEYWORDS = [
     'ignore instructions', 'root access', 'admin', 'malicious', 'code injection'
 ]
 
+# Fields of a data row used to build the rainfall chart
+CHART_FIELDS = itemgetter('year', 'scenario', 'avg_annual_rainfall_mm')
+
+# Canned replies for generic queries, answered without touching the model
+GREETING_RESPONSE = "Hello! I'm a chatbot that provides district-level groundwater and rainfall data. Try asking something like 'District names'."
+GREETING_RESPONSES = {
+    'hi': GREETING_RESPONSE,
+    'hello': GREETING_RESPONSE,
+    'hey': GREETING_RESPONSE,
+    'who are you': "I'm a District Information Chatbot, designed to provide data on districts like rainfall, groundwater levels, and population. Ask me about a specific district or data point, e.g., 'District names'.",
+}
+
+# Single-pass query filter: an exact greeting or any forbidden keyword, reported via match.lastgroup
+QUERY_FILTER_RE = re.compile(
+    "^(?P<greeting>" + "|".join(map(re.escape, GREETING_RESPONSES)) + ")$"
+    "|(?P<forbidden>" + "|".join(map(re.escape, FORBIDDEN_KEYWORDS)) + ")"
+)
+
 # Load the data
 def load_data(file_path: str) -> List[Dict]:
     try:
         if not os.path.exists(file_path):
-            logger.error(f"File not found: {file_path}")
+            logger.error("File not found: %s", file_path)
             raise FileNotFoundError(f"File not found: {file_path}")
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read().strip()
             if not content:
-                logger.error(f"File is empty: {file_path}")
+                logger.error("File is empty: %s", file_path)
                 raise ValueError(f"File is empty: {file_path}")
             data = json.loads(content)
-        logger.debug(f"Loaded {len(data)} entries from {file_path}")
+        logger.debug("Loaded %s entries from %s", len(data), file_path)
         return [entry['output'] for entry in data]
     except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in {file_path}: {str(e)}")
+        logger.error("Invalid JSON in %s: %s", file_path, e)
         raise
     except Exception as e:
-        logger.error(f"Error loading data from {file_path}: {str(e)}")
+        logger.error("Error loading data from %s: %s", file_path, e)
         raise
 
 # Convert district data to text for embedding
@@ -50,75 +84,264 @@ def data_to_text(data: Dict) -> str:
         f"Rainfall: {data['avg_annual_rainfall_mm']} mm, Groundwater Level: {data['groundwater_level_m']} m"
     )
 
-# Create embeddings and FAISS index
-def create_vector_store(data: List[Dict]) -> tuple:
+# Embedding model and on-disk cache for embeddings / FAISS index
+MODEL_NAME = 'all-MiniLM-L6-v2'
+CACHE_DIR = 'cache'
+
+# INT8 dynamically quantized ONNX export of the model, created once under CACHE_DIR
+ENCODER_TYPE = 'onnx-int8'
+ONNX_MODEL_DIR = os.path.join(CACHE_DIR, f"{MODEL_NAME}-{ENCODER_TYPE}")
+ONNX_MODEL_FILE = 'model_quantized.onnx'
+MAX_SEQ_LENGTH = 256
+QUERY_MAX_LENGTH = 128
+
+# HNSW graph over fp16 scalar-quantized vectors: neighbours per node and candidate list sizes at build / search time
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 32
+
+# Corpora of at least IVF_MIN_ROWS rows use IVF partitioning instead, scanning nprobe of nlist ~ 4*sqrt(rows) lists
+IVF_MIN_ROWS = 10000
+IVF_NPROBE = 8
+
+# Rows are encoded in length-sorted batches with unit-normalized output, so inner product is cosine similarity
+ENCODE_BATCH_SIZE = 64
+
+# Average token embeddings over the non-padding positions given by the attention mask
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    mask = attention_mask[..., None].astype(np.float32)
+    return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+# Sentence encoder running the quantized ONNX model with mean pooling, as in the all-MiniLM-L6-v2 pipeline.
+# It uses the Rust tokenizers library directly: importing transformers would also import torch.
+class OnnxSentenceEncoder:
+    def __init__(self, model_dir: str):
+        tokenizer_path = os.path.join(model_dir, 'tokenizer.json')
+        # One tokenizer per truncation length, since truncation is tokenizer state shared across request threads
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.query_tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.query_tokenizer.no_padding()
+        self.query_tokenizer.enable_truncation(QUERY_MAX_LENGTH)
+        self.pad_id = self.tokenizer.token_to_id('[PAD]') or 0
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = NUM_THREADS
+        session_options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE), sess_options=session_options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = True) -> np.ndarray:
+        # Smart batching: tokenize once, batch rows in token-length order so each batch pads to a similar
+        # length, then restore the input order
+        encodings = self.tokenizer.encode_batch(texts)
+        order = np.argsort([len(encoding.ids) for encoding in encodings], kind='stable')
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            feeds = self._feeds([encodings[i] for i in order[start:start + batch_size]])
+            token_embeddings = self.session.run(None, self._session_inputs(feeds))[0]
+            batches.append(mean_pool(token_embeddings, feeds['attention_mask']))
+        embeddings = np.vstack(batches)[np.argsort(order)].astype(np.float32, copy=False)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+    # Single-query fast path: no batching or padding, shorter truncation, always unit-normalized
+    def encode_query(self, query: str) -> np.ndarray:
+        feeds = self._feeds([self.query_tokenizer.encode(query)])
+        token_embeddings = self.session.run(None, self._session_inputs(feeds))[0]
+        embedding = mean_pool(token_embeddings, feeds['attention_mask']).astype(np.float32, copy=False)
+        embedding /= max(float(np.linalg.norm(embedding)), 1e-12)
+        return embedding
+
+    # Right-pad a batch of encodings into int64 model input arrays
+    def _feeds(self, encodings) -> Dict[str, np.ndarray]:
+        length = max(len(encoding.ids) for encoding in encodings)
+        feeds = {
+            'input_ids': np.full((len(encodings), length), self.pad_id, dtype=np.int64),
+            'attention_mask': np.zeros((len(encodings), length), dtype=np.int64),
+            'token_type_ids': np.zeros((len(encodings), length), dtype=np.int64),
+        }
+        for row, encoding in enumerate(encodings):
+            size = len(encoding.ids)
+            feeds['input_ids'][row, :size] = encoding.ids
+            feeds['attention_mask'][row, :size] = encoding.attention_mask
+            feeds['token_type_ids'][row, :size] = encoding.type_ids
+        return feeds
+
+    def _session_inputs(self, feeds: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        return {name: value for name, value in feeds.items() if name in self.input_names}
+
+# Write a cache file through a temporary path and os.replace it into place, so a crash never leaves a partial file
+def atomic_write(path: str, write: Callable[[str], None]) -> None:
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Whether model_dir holds both the quantized model and its tokenizer
+def onnx_export_complete(model_dir: str) -> bool:
+    return all(os.path.exists(os.path.join(model_dir, name)) for name in (ONNX_MODEL_FILE, 'tokenizer.json'))
+
+# Export the model to ONNX and apply INT8 dynamic quantization. The export is built in a uniquely named
+# temporary directory and renamed into place only once both the tokenizer and the quantized model are saved.
+def export_onnx_model(model_dir: str) -> None:
+    # torch, transformers and optimum are only needed for this one-time export, so serving never imports them
+    import torch
+    from transformers import AutoTokenizer
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    torch.set_num_threads(NUM_THREADS)
+    torch.set_num_interop_threads(1)
+    tmp_dir = f"{model_dir}.{uuid.uuid4().hex}.tmp"
+    try:
+        logger.debug("Exporting %s to quantized ONNX in %s", MODEL_NAME, model_dir)
+        model_id = f"sentence-transformers/{MODEL_NAME}"
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(tmp_dir)
+        ort_model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+        quantizer = ORTQuantizer.from_pretrained(ort_model)
+        quantization_config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=tmp_dir, quantization_config=quantization_config)
+        # Keep an export another process finished meanwhile; only replace an incomplete leftover
+        if not onnx_export_complete(model_dir):
+            shutil.rmtree(model_dir, ignore_errors=True)
+            os.replace(tmp_dir, model_dir)
+    except Exception as e:
+        logger.error("Error exporting ONNX model: %s", e)
+        raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# Number of IVF lists for a corpus of the given size, or None when it is small enough for HNSW
+def get_ivf_nlist(num_rows: int) -> Optional[int]:
+    if num_rows >= IVF_MIN_ROWS:
+        return max(4, int(4 * math.sqrt(num_rows)))
+    return None
+
+# Describe the FAISS index used for a corpus of the given size (also part of the cache key)
+def get_index_type(num_rows: int) -> str:
+    nlist = get_ivf_nlist(num_rows)
+    if nlist is not None:
+        return f"IVF{nlist},SQfp16,IP"
+    return f"HNSW{HNSW_M},SQfp16,IP"
+
+# Build an inner-product FAISS index over fp16 scalar-quantized vectors
+def build_index(embeddings: np.ndarray):
+    num_rows, dimension = embeddings.shape
+    nlist = get_ivf_nlist(num_rows)
+    if nlist is not None:
+        quantizer = faiss.IndexFlatIP(dimension)
+        faiss_index = faiss.IndexIVFScalarQuantizer(
+            quantizer, dimension, nlist, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+        )
+    else:
+        faiss_index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        faiss_index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    set_search_params(faiss_index)
+    faiss_index.train(embeddings)
+    faiss_index.add(embeddings)
+    return faiss_index
+
+# Apply query-time parameters, which are not all restored by faiss.read_index
+def set_search_params(faiss_index) -> None:
+    if isinstance(faiss_index, faiss.IndexIVF):
+        faiss_index.nprobe = IVF_NPROBE
+    else:
+        faiss_index.hnsw.efSearch = HNSW_EF_SEARCH
+
+# The encoder is created on first use. The lock stops concurrent first requests in a gthread worker
+# from each exporting the model or building their own InferenceSession.
+_encoder: Optional[OnnxSentenceEncoder] = None
+_encoder_lock = threading.Lock()
+
+# Load the embedding model only when it is actually needed
+def load_model() -> OnnxSentenceEncoder:
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                if not onnx_export_complete(ONNX_MODEL_DIR):
+                    export_onnx_model(ONNX_MODEL_DIR)
+                logger.debug("Loading quantized ONNX model from %s", ONNX_MODEL_DIR)
+                _encoder = OnnxSentenceEncoder(ONNX_MODEL_DIR)
+    return _encoder
+
+# Drop the loaded encoder so the next load_model() call builds a new one
+def unload_model() -> None:
+    global _encoder
+    with _encoder_lock:
+        _encoder = None
+
+# Encode a single query as a (1, dim) unit-normalized float32 array
+def encode_query(query: str) -> np.ndarray:
+    return load_model().encode_query(query)
+
+# Encode the data rows into a contiguous, unit-normalized float32 matrix
+def encode_texts(texts: List[str]) -> np.ndarray:
+    embeddings = load_model().encode(texts, batch_size=ENCODE_BATCH_SIZE)
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+# Create embeddings and FAISS index, reusing the on-disk cache when the data is unchanged.
+# The embedding matrix is cached separately from the index and is only read when the index has to be
+# (re)built, so changing index parameters never re-encodes.
+def create_vector_store(data: List[Dict]):
     try:
-        model = SentenceTransformer('all-MiniLM-L6-v2')
         texts = [data_to_text(entry) for entry in data]
-        embeddings = model.encode(texts, convert_to_numpy=True)
-        logger.debug(f"Embeddings shape: {embeddings.shape}, type: {type(embeddings)}")
-        
-        dimension = embeddings.shape[1]
-        faiss_index = faiss.IndexFlatL2(dimension)
-        logger.debug(f"FAISS index type: {type(faiss_index)}")
-        faiss_index.add(embeddings)
-        logger.debug(f"Added {faiss_index.ntotal} embeddings to FAISS index")
+        embeddings_key = hashlib.sha256(("\n".join(texts) + MODEL_NAME + ENCODER_TYPE + "fp16").encode('utf-8')).hexdigest()
+        index_key = hashlib.sha256((embeddings_key + get_index_type(len(texts))).encode('utf-8')).hexdigest()
+        embeddings_path = os.path.join(CACHE_DIR, f"{embeddings_key}.npy")
+        index_path = os.path.join(CACHE_DIR, f"{index_key}.index")
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+        if os.path.exists(index_path):
+            faiss_index = faiss.read_index(index_path)
+            set_search_params(faiss_index)
+            logger.debug("Loaded cached FAISS index with %s embeddings from %s", faiss_index.ntotal, index_path)
+            return faiss_index
+
+        # Embeddings are cached as float16 (half the disk and read bandwidth); FAISS gets a float32 copy to
+        # build from, and the index itself stores fp16 via the scalar quantizer
+        if os.path.exists(embeddings_path):
+            embeddings = np.load(embeddings_path)
+            logger.debug("Loaded cached embeddings %s from %s", embeddings.shape, embeddings_path)
+        else:
+            embeddings = encode_texts(texts).astype(np.float16)
+            atomic_write(embeddings_path, lambda path: np.save(path, embeddings))
+            logger.debug("Saved embeddings %s to %s", embeddings.shape, embeddings_path)
+
+        faiss_index = build_index(np.ascontiguousarray(embeddings, dtype=np.float32))
+        atomic_write(index_path, lambda path: faiss.write_index(faiss_index, path))
+        logger.debug("FAISS index type: %s", type(faiss_index))
+        logger.debug("Added %s embeddings to FAISS index and saved it to %s", faiss_index.ntotal, index_path)
         
-        return model, faiss_index, texts
+        return faiss_index
     except Exception as e:
-        logger.error(f"Error creating vector store: {str(e)}")
+        logger.error("Error creating vector store: %s", e)
         raise
 
-# Retrieve top-k relevant documents with similarity threshold
-def retrieve_documents(query: str, model, faiss_index, texts: List[str], k: int = 3, threshold: float = 1.0) -> List[str]:
+# Retrieve indices of the top-k relevant rows with cosine similarity threshold
+def retrieve_documents(query: str, faiss_index, k: int = 3, threshold: float = 0.5) -> List[int]:
     try:
-        logger.debug(f"Processing query: {query}")
-        query_embedding = model.encode([query], convert_to_numpy=True)
-        logger.debug(f"Query embedding shape: {query_embedding.shape}")
-        logger.debug(f"FAISS index type before search: {type(faiss_index)}")
-        if not hasattr(faiss_index, 'search'):
-            logger.error(f"FAISS index does not have 'search' method. Type: {type(faiss_index)}")
-            raise AttributeError("Invalid FAISS index")
-        distances, indices = faiss_index.search(query_embedding, k)
-        logger.debug(f"Retrieved indices: {indices}, distances: {distances}")
-        valid_docs = [texts[i] for i, dist in zip(indices[0], distances[0]) if dist < threshold]
-        return valid_docs if valid_docs else []
+        logger.debug("Processing query: %s", query)
+        # FAISS copies anything that is not C-contiguous float32; this is a no-op for the encoder output
+        query_embedding = np.ascontiguousarray(encode_query(query), dtype=np.float32)
+        logger.debug("Query embedding shape: %s", query_embedding.shape)
+        similarities, indices = faiss_index.search(query_embedding, k)
+        logger.debug("Retrieved indices: %s, similarities: %s", indices, similarities)
+        return [int(i) for i, sim in zip(indices[0], similarities[0]) if i >= 0 and sim > threshold]
     except Exception as e:
-        logger.error(f"Error retrieving documents: {str(e)}")
+        logger.error("Error retrieving documents: %s", e)
         raise
 
-# Generate response as HTML table and chart
-def generate_response(query: str, retrieved_docs: List[str], data: List[Dict]) -> str:
-    query_lower = query.lower().strip()
-    # Handle generic queries
-    if query_lower in ['hi', 'hello', 'hey']:
-        return "Hello! I'm a chatbot that provides district-level groundwater and rainfall data. Try asking something like 'District names'."
-    if query_lower == 'who are you':
-        return "I'm a District Information Chatbot, designed to provide data on districts like rainfall, groundwater levels, and population. Ask me about a specific district or data point, e.g., 'District names'."
-    
-    # If no relevant documents, return a fallback message
-    if not retrieved_docs:
-        return f"Sorry, I couldn't find relevant data for '{query}'. Please try a query like 'Ariyalur rainfall in 2020'."
-
-    # Parse retrieved documents into structured data
-    table_rows = []
-    chart_data = []
-    is_ariyalur = 'ariyalur' in query_lower
-    
-    for doc in retrieved_docs:
-        fields = {}
-        for part in doc.split(", "):
-            key, value = part.split(": ", 1)
-            fields[key.lower().replace(" ", "_")] = value
-        table_rows.append(fields)
-        if is_ariyalur:
-            chart_data.append({
-                'label': f"{fields['year']} ({fields['scenario']})",
-                'rainfall': float(fields['rainfall'].replace(" mm", ""))
-            })
-    
-    # Create HTML table
-    table_html = """
+# Static HTML for the response table; rows are filled in with TABLE_ROW.format(**row)
+TABLE_PREFIX = """
     <style>
         table { border-collapse: collapse; width: 100%; margin-top: 10px; }
         th, td { border: 1px solid #ccc; padding: 8px; text-align: left; }
@@ -135,59 +358,81 @@ def generate_response(query: str, retrieved_docs: List[str], data: List[Dict]) -
             <th>Population</th>
         </tr>
     """
-    for row in table_rows:
-        table_html += f"""
+TABLE_ROW = """
         <tr>
-            <td>{row['district']}</td>
-            <td>{row['year']}</td>
-            <td>{row['scenario']}</td>
-            <td>{row['rainfall']}</td>
-            <td>{row['groundwater_level']}</td>
-            <td>{row['population']}</td>
+            <td>{district}</td>
+            <td>{year}</td>
+            <td>{scenario}</td>
+            <td>{avg_annual_rainfall_mm} mm</td>
+            <td>{groundwater_level_m} m</td>
+            <td>{population_estimate}</td>
         </tr>
         """
-    table_html += "</table>"
-    
-    # Create Chart.js chart for Ariyalur rainfall
-    chart_html = ""
-    if is_ariyalur and chart_data:
-        chart_config = {
-            "type": "bar",
-            "data": {
-                "labels": [item['label'] for item in chart_data],
-                "datasets": [{
-                    "label": "Rainfall (mm)",
-                    "data": [item['rainfall'] for item in chart_data],
-                    "backgroundColor": ["#007bff", "#28a745", "#dc3545"],
-                    "borderColor": ["#0056b3", "#218838", "#c82333"],
-                    "borderWidth": 1
-                }]
+
+# Chart.js config for the rainfall chart; only the labels and data arrays change per request
+CHART_CONFIG = {
+    "type": "bar",
+    "data": {
+        "labels": "$labels",
+        "datasets": [{
+            "label": "Rainfall (mm)",
+            "data": "$data",
+            "backgroundColor": ["#007bff", "#28a745", "#dc3545"],
+            "borderColor": ["#0056b3", "#218838", "#c82333"],
+            "borderWidth": 1
+        }]
+    },
+    "options": {
+        "scales": {
+            "y": {
+                "beginAtZero": True,
+                "title": {"display": True, "text": "Rainfall (mm)"}
             },
-            "options": {
-                "scales": {
-                    "y": {
-                        "beginAtZero": True,
-                        "title": {"display": True, "text": "Rainfall (mm)"}
-                    },
-                    "x": {
-                        "title": {"display": True, "text": "Year (Scenario)"}
-                    }
-                },
-                "plugins": {
-                    "legend": {"display": True},
-                    "title": {"display": True, "text": "Ariyalur Rainfall Comparison"}
-                }
+            "x": {
+                "title": {"display": True, "text": "Year (Scenario)"}
             }
+        },
+        "plugins": {
+            "legend": {"display": True},
+            "title": {"display": True, "text": "Ariyalur Rainfall Comparison"}
         }
-        chart_html = f"""
+    }
+}
+# The static JSON is encoded once; the quoted placeholders become bare $labels / $data substitutions
+CHART_HTML = Template("""
         <canvas id="rainfallChart" width="400" height="200"></canvas>
         <script>
-            document.addEventListener('DOMContentLoaded', () => {{
+            document.addEventListener('DOMContentLoaded', () => {
                 const ctx = document.getElementById('rainfallChart').getContext('2d');
-                new Chart(ctx, {json.dumps(chart_config)});
-            }});
+                new Chart(ctx, %s);
+            });
         </script>
-        """
+        """ % orjson.dumps(CHART_CONFIG).decode().replace('"$labels"', '$labels').replace('"$data"', '$data'))
+
+# Generate response as HTML table and chart
+def generate_response(query: str, query_lower: str, retrieved_indices: List[int], data: List[Dict]) -> str:
+    # If no relevant documents, return a fallback message
+    if not retrieved_indices:
+        return f"Sorry, I couldn't find relevant data for '{query}'. Please try a query like 'Ariyalur rainfall in 2020'."
+
+    # Look up the retrieved rows directly in the structured data
+    table_rows = [data[i] for i in retrieved_indices]
+    is_ariyalur = 'ariyalur' in query_lower
+    chart_data = [
+        {'label': f"{year} ({scenario})", 'rainfall': float(rainfall)}
+        for year, scenario, rainfall in map(CHART_FIELDS, table_rows)
+    ] if is_ariyalur else []
+    
+    # Create HTML table
+    table_html = TABLE_PREFIX + "".join([TABLE_ROW.format(**row) for row in table_rows]) + "</table>"
+    
+    # Create Chart.js chart for Ariyalur rainfall
+    chart_html = ""
+    if is_ariyalur and chart_data:
+        chart_html = CHART_HTML.substitute(
+            labels=orjson.dumps([item['label'] for item in chart_data]).decode(),
+            data=orjson.dumps([item['rainfall'] for item in chart_data]).decode()
+        )
     
     response = f"Based on your query '{query}', here is the relevant information:<br>{table_html}"
     if chart_html:
@@ -199,11 +444,23 @@ def generate_response(query: str, retrieved_docs: List[str], data: List[Dict]) -
 DATA_PATH = r"C:\Users\Bharath\Desktop\actual final\data.json"
 try:
     data = load_data(DATA_PATH)
-    model, faiss_index, texts = create_vector_store(data)
+    faiss_index = create_vector_store(data)
+    # A cold cache loads the ONNX session here, which under gunicorn --preload is the master process.
+    # Its intra-op thread pool does not survive fork, so drop it and let each worker create its own.
+    unload_model()
 except Exception as e:
-    logger.error(f"Failed to initialize chatbot: {str(e)}")
+    logger.error("Failed to initialize chatbot: %s", e)
     raise
 
+# Cache retrieval per normalized query so repeated queries skip both encoding and the FAISS search
+@lru_cache(maxsize=1024)
+def _encode_and_search(query_lower: str) -> tuple:
+    return tuple(retrieve_documents(query_lower, faiss_index, k=3, threshold=0.5))
+
+# Serialize JSON responses with orjson instead of Flask's stdlib-based jsonify
+def json_response(payload: Dict, status: int = 200) -> Response:
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
 # Flask routes
 @app.route('/')
 def index():
@@ -214,21 +471,25 @@ def chat():
     try:
         query = request.json.get('query')
         if not query:
-            return jsonify({'response': 'Please provide a query.'}), 400
+            return json_response({'response': 'Please provide a query.'}, 400)
         
-        # Check for forbidden keywords
+        # Check for forbidden keywords and greetings in one scan
         query_lower = query.lower().strip()
-        if any(keyword in query_lower for keyword in FORBIDDEN_KEYWORDS):
-            logger.warning(f"Forbidden query detected: {query}")
-            return jsonify({'response': 'Wrong question you asked.'}), 400
+        match = QUERY_FILTER_RE.search(query_lower)
+        if match is not None and match.lastgroup == 'forbidden':
+            logger.warning("Forbidden query detected: %s", query)
+            return json_response({'response': 'Wrong question you asked.'}, 400)
+        if match is not None and match.lastgroup == 'greeting':
+            return json_response({'response': GREETING_RESPONSES[query_lower]})
         
-        retrieved_docs = retrieve_documents(query, model, faiss_index, texts, k=3, threshold=1.0)
-        response = generate_response(query, retrieved_docs, data)
-        logger.debug(f"Response generated for query '{query}': {response[:100]}...")
-        return jsonify({'response': response})
+        retrieved_indices = list(_encode_and_search(query_lower))
+        logger.debug("Retrieved row indices: %s", retrieved_indices)
+        response = generate_response(query, query_lower, retrieved_indices, data)
+        logger.debug("Response generated for query '%s': %s...", query, response[:100])
+        return json_response({'response': response})
     except Exception as e:
-        logger.error(f"Error in /chat endpoint: {str(e)}")
-        return jsonify({'response': f'Error: {str(e)}'}), 500
+        logger.error("Error in /chat endpoint: %s", e)
+        return json_response({'response': f'Error: {str(e)}'}, 500)
 
 # HTML template for chat interface
 def create_html_template():
@@ -364,20 +625,23 @@ def create_html_template():
             f.write(html_content)
         logger.debug("Created HTML template")
     except Exception as e:
-        logger.error(f"Error creating HTML template: {str(e)}")
+        logger.error("Error creating HTML template: %s", e)
         raise
 
+# Write the template at import time so it also exists when served by gunicorn, e.g.
+#   gunicorn -w 4 -k gthread --threads 8 --preload chatbot:app
+# With --preload the data and FAISS index are loaded once in the master and shared copy-on-write by the workers;
+# the ONNX session is always created per worker, on the first query.
+create_html_template()
+
+# Development server only; under gunicorn this module is imported, not run
 if __name__ == "__main__":
     try:
-        logger.debug(f"Starting Flask app at {os.getcwd()}")
-        create_html_template()
-        webbrowser.open('http://127.0.0.1:5000')
-        app.run(debug=False, port=5000)
+        port = int(os.environ.get("PORT", 5000))
+        logger.debug("Starting Flask app at %s", os.getcwd())
+        webbrowser.open(f'http://127.0.0.1:{port}')
+        app.run(host='0.0.0.0', port=port, debug=False)
     except Exception as e:
-        logger.error(f"Failed to start Flask app: {str(e)}")
-
+        logger.error("Failed to start Flask app: %s", e)
         raise
-    if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host='0.0.0.0', port=port)
 